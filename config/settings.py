@@ -1,32 +1,11 @@
 import os
+from dataclasses import dataclass, fields
+from functools import lru_cache
 from pathlib import Path
 from dotenv import load_dotenv
 
-# Charger les variables d'environnement
-load_dotenv()
-
 # Chemins de base
 BASE_DIR = Path(__file__).parent.parent
-DATA_DIR = BASE_DIR / "data"
-LOGS_DIR = BASE_DIR / "logs"
-
-# Configuration API Gemini
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-1.0-pro-vision")
-
-# Configuration traitement
-BATCH_SIZE = int(os.getenv("BATCH_SIZE", 8))
-MAX_IMAGE_SIZE_MB = float(os.getenv("MAX_IMAGE_SIZE_MB", 1.8))
-COMPRESSION_QUALITY = int(os.getenv("COMPRESSION_QUALITY", 85))
-
-# Chemins des dossiers
-INPUT_DIR = BASE_DIR / os.getenv("INPUT_DIR", "data/input")
-PROCESSED_DIR = BASE_DIR / os.getenv("PROCESSED_DIR", "data/processed")
-OUTPUT_DIR = BASE_DIR / os.getenv("OUTPUT_DIR", "data/output")
-ARCHIVE_DIR = BASE_DIR / os.getenv("ARCHIVE_DIR", "data/archive")
-
-# Configuration logging
-LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
 
 # Formats d'images supportés
 SUPPORTED_IMAGE_FORMATS = {'.jpg', '.jpeg', '.png', '.webp', '.heic', '.heif'}
@@ -34,7 +13,7 @@ SUPPORTED_IMAGE_FORMATS = {'.jpg', '.jpeg', '.png', '.webp', '.heic', '.heif'}
 # Schéma de données attendu pour les produits
 PRODUCT_SCHEMA = {
    "nom_produit": "Nom du produit",
-   "description_type": "Description/Type du produit", 
+   "description_type": "Description/Type du produit",
    "volume": "Volume/Quantité",
    "prix_fcfa": "Prix en FCFA",
    "code_barres_ean": "Code-barres EAN",
@@ -42,10 +21,81 @@ PRODUCT_SCHEMA = {
    "source_information": "Source d'information (lisible/estimé)"
 }
 
-# Validation des variables obligatoires
-if not GOOGLE_API_KEY:
-   raise ValueError("GOOGLE_API_KEY doit être défini dans le fichier .env")
 
-# Création des dossiers s'ils n'existent pas
-for directory in [DATA_DIR, INPUT_DIR, PROCESSED_DIR, OUTPUT_DIR, ARCHIVE_DIR, LOGS_DIR]:
-   directory.mkdir(parents=True, exist_ok=True)
\ No newline at end of file
+@dataclass(frozen=True, slots=True)
+class Settings:
+   """Configuration issue de l'environnement, figée après le premier chargement"""
+
+   DATA_DIR: Path
+   LOGS_DIR: Path
+   GOOGLE_API_KEY: str
+   GEMINI_MODEL: str
+   BATCH_SIZE: int
+   MAX_CONCURRENT_BATCHES: int
+   MAX_IMAGE_SIZE_MB: float
+   COMPRESSION_QUALITY: int
+   INPUT_DIR: Path
+   PROCESSED_DIR: Path
+   OUTPUT_DIR: Path
+   ARCHIVE_DIR: Path
+   LOG_LEVEL: str
+
+
+_SETTINGS_FIELDS = frozenset(f.name for f in fields(Settings))
+
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+   """
+   Charge la configuration une seule fois (.env + variables d'environnement)
+
+   Returns:
+       Settings: Configuration partagée par tous les modules
+   """
+   # Charger les variables d'environnement
+   load_dotenv()
+
+   # Configuration API Gemini
+   google_api_key = os.getenv("GOOGLE_API_KEY")
+   gemini_model = os.getenv("GEMINI_MODEL", "gemini-1.0-pro-vision")
+
+   # Validation des variables obligatoires
+   if not google_api_key:
+      raise ValueError("GOOGLE_API_KEY doit être défini dans le fichier .env")
+
+   settings = Settings(
+      DATA_DIR=BASE_DIR / "data",
+      LOGS_DIR=BASE_DIR / "logs",
+      GOOGLE_API_KEY=google_api_key,
+      GEMINI_MODEL=gemini_model,
+      # Configuration traitement
+      BATCH_SIZE=int(os.getenv("BATCH_SIZE", 8)),
+      MAX_CONCURRENT_BATCHES=int(os.getenv("MAX_CONCURRENT_BATCHES", 8)),
+      MAX_IMAGE_SIZE_MB=float(os.getenv("MAX_IMAGE_SIZE_MB", 1.8)),
+      COMPRESSION_QUALITY=int(os.getenv("COMPRESSION_QUALITY", 85)),
+      # Chemins des dossiers
+      INPUT_DIR=BASE_DIR / os.getenv("INPUT_DIR", "data/input"),
+      PROCESSED_DIR=BASE_DIR / os.getenv("PROCESSED_DIR", "data/processed"),
+      OUTPUT_DIR=BASE_DIR / os.getenv("OUTPUT_DIR", "data/output"),
+      ARCHIVE_DIR=BASE_DIR / os.getenv("ARCHIVE_DIR", "data/archive"),
+      # Configuration logging
+      LOG_LEVEL=os.getenv("LOG_LEVEL", "INFO"),
+   )
+
+   return settings
+
+
+@lru_cache(maxsize=1)
+def ensure_directories() -> None:
+   """Crée les dossiers de travail s'ils n'existent pas (une seule fois par processus)"""
+   settings = get_settings()
+   for directory in [settings.DATA_DIR, settings.INPUT_DIR, settings.PROCESSED_DIR,
+                     settings.OUTPUT_DIR, settings.ARCHIVE_DIR, settings.LOGS_DIR]:
+      directory.mkdir(parents=True, exist_ok=True)
+
+
+def __getattr__(name: str):
+   # Permet `from config.settings import X` sur les valeurs de Settings
+   if name in _SETTINGS_FIELDS:
+      return getattr(get_settings(), name)
+   raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,14 +1,80 @@
+import csv
 import logging
 import json
-import pandas as pd
+import re
+from collections import Counter
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Set
 from datetime import datetime
-import openpyxl
-from openpyxl.styles import Font, PatternFill, Alignment
 
 from config.settings import OUTPUT_DIR, PRODUCT_SCHEMA
-from src.file_manager import FileManager
+from src.file_manager import get_file_manager
+
+# Expressions précompilées pour le nettoyage des champs
+_PRICE_RE = re.compile(r'[^\d.,]')
+_BARCODE_RE = re.compile(r'\D')
+
+# Unités de volume standardisées (les formes longues d'abord pour l'alternance)
+_VOLUME_UNITS = {
+    'millilitres': 'mL',
+    'millilitre': 'mL',
+    'kilogrammes': 'kg',
+    'kilogramme': 'kg',
+    'litres': 'L',
+    'litre': 'L',
+    'grammes': 'g',
+    'gramme': 'g'
+}
+_VOLUME_RE = re.compile('|'.join(_VOLUME_UNITS))
+
+
+def _clean_price(price_str: str) -> str:
+    """Nettoie et standardise les prix"""
+    # Supprimer les caractères non numériques sauf points et virgules
+    cleaned = _PRICE_RE.sub('', price_str)
+    return cleaned or "Non détecté"
+
+
+def _clean_volume(volume_str: str) -> str:
+    """Nettoie et standardise les volumes"""
+    # Standardiser les unités communes en une seule passe
+    standardized = _VOLUME_RE.sub(lambda m: _VOLUME_UNITS[m.group(0)], volume_str.lower())
+    return standardized.strip()
+
+
+def _clean_barcode(barcode_str: str) -> str:
+    """Nettoie les codes-barres"""
+    # Garder seulement les chiffres
+    cleaned = _BARCODE_RE.sub('', barcode_str)
+    return cleaned or "Non détecté"
+
+
+# Nettoyage spécifique par champ du schéma
+_FIELD_CLEANERS = {
+    'prix_fcfa': _clean_price,
+    'volume': _clean_volume,
+    'code_barres_ean': _clean_barcode
+}
+
+# Métadonnées conservées telles quelles lorsqu'elles sont présentes
+_META_FIELDS = ('nom_fichier', 'chemin_fichier', 'erreur')
+
+# Champs du schéma et valeurs considérées comme non renseignées
+_SCHEMA_KEYS = tuple(PRODUCT_SCHEMA)
+_INCOMPLETE_VALUES = frozenset({"", "Non détecté", "Erreur d'analyse"})
+
+# Valeurs brutes (en minuscules) signifiant qu'une information est absente
+_EMPTY_SENTINELS = frozenset({'', 'n/a', 'na', 'null', 'none', '?', '-'})
+
+# Ordre des colonnes dans les fichiers de sortie
+_XLSX_COLUMN_ORDER = (
+    'numero_sequence', 'nom_fichier', 'nom_produit', 'description_type',
+    'volume', 'prix_fcfa', 'code_barres_ean', 'code_article',
+    'source_information', 'statut', 'score_completude',
+    'date_traitement'
+)
+_CSV_COLUMN_ORDER = _XLSX_COLUMN_ORDER + ('chemin_fichier',)
+_CSV_BUFFER_SIZE = 1 << 20
 
 
 class DataProcessor:
@@ -16,8 +82,8 @@ class DataProcessor:
     
     def __init__(self):
         self.logger = logging.getLogger(__name__)
-        self.file_manager = FileManager()
-        self.output_dir = Path(OUTPUT_DIR)
+        self.file_manager = get_file_manager()
+        self.output_dir = OUTPUT_DIR
         
     def process_results(self, raw_results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """
@@ -39,6 +105,9 @@ class DataProcessor:
             'partiels': 0
         }
         
+        # Un seul horodatage pour tout le lot
+        processing_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        
         for i, result in enumerate(raw_results, 1):
             try:
                 # Nettoyer et valider les données
@@ -46,7 +115,7 @@ class DataProcessor:
                 
                 # Ajouter des métadonnées
                 cleaned_result['numero_sequence'] = i
-                cleaned_result['date_traitement'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                cleaned_result['date_traitement'] = processing_date
                 
                 # Calculer le score de complétude
                 completeness_score = self._calculate_completeness(cleaned_result)
@@ -86,83 +155,30 @@ class DataProcessor:
         cleaned = {}
         
         # Nettoyer chaque champ
-        for field in PRODUCT_SCHEMA.keys():
+        for field in _SCHEMA_KEYS:
             value = result.get(field, "Non détecté")
             
             if isinstance(value, str):
                 # Nettoyer les espaces et caractères spéciaux
                 value = value.strip()
                 
-                # Traiter les cas spéciaux
-                if value.lower() in ['', 'n/a', 'na', 'null', 'none', '?', '-']:
+                # Traiter les cas spéciaux, puis le nettoyage propre au champ
+                if value.lower() in _EMPTY_SENTINELS:
                     value = "Non détecté"
-                elif field == 'prix_fcfa':
-                    value = self._clean_price(value)
-                elif field == 'volume':
-                    value = self._clean_volume(value)
-                elif field == 'code_barres_ean':
-                    value = self._clean_barcode(value)
+                elif value != "Non détecté":
+                    clean_fn = _FIELD_CLEANERS.get(field)
+                    if clean_fn is not None:
+                        value = clean_fn(value)
             
             cleaned[field] = value
         
         # Conserver les métadonnées
-        for meta_field in ['nom_fichier', 'chemin_fichier', 'erreur']:
+        for meta_field in _META_FIELDS:
             if meta_field in result:
                 cleaned[meta_field] = result[meta_field]
         
         return cleaned
     
-    def _clean_price(self, price_str: str) -> str:
-        """Nettoie et standardise les prix"""
-        if price_str == "Non détecté":
-            return price_str
-        
-        # Supprimer les caractères non numériques sauf points et virgules
-        import re
-        cleaned = re.sub(r'[^\d.,]', '', price_str)
-        
-        if not cleaned:
-            return "Non détecté"
-        
-        return cleaned
-    
-    def _clean_volume(self, volume_str: str) -> str:
-        """Nettoie et standardise les volumes"""
-        if volume_str == "Non détecté":
-            return volume_str
-        
-        # Standardiser les unités communes
-        volume_str = volume_str.lower()
-        replacements = {
-            'litres': 'L',
-            'litre': 'L',
-            'millilitres': 'mL',
-            'millilitre': 'mL',
-            'grammes': 'g',
-            'gramme': 'g',
-            'kilogrammes': 'kg',
-            'kilogramme': 'kg'
-        }
-        
-        for old, new in replacements.items():
-            volume_str = volume_str.replace(old, new)
-        
-        return volume_str.strip()
-    
-    def _clean_barcode(self, barcode_str: str) -> str:
-        """Nettoie les codes-barres"""
-        if barcode_str == "Non détecté":
-            return barcode_str
-        
-        # Garder seulement les chiffres
-        import re
-        cleaned = re.sub(r'[^\d]', '', barcode_str)
-        
-        if not cleaned:
-            return "Non détecté"
-        
-        return cleaned
-    
     def _calculate_completeness(self, result: Dict[str, Any]) -> float:
         """
         Calcule le score de complétude d'un résultat
@@ -173,15 +189,15 @@ class DataProcessor:
         Returns:
             float: Score de complétude (0-100)
         """
-        total_fields = len(PRODUCT_SCHEMA)
-        complete_fields = 0
-        
-        for field in PRODUCT_SCHEMA.keys():
-            value = result.get(field, "")
-            if value and value != "Non détecté" and value != "Erreur d'analyse":
-                complete_fields += 1
-        
-        return (complete_fields / total_fields) * 100
+        # Seules les chaînes sont comparées aux valeurs vides : une liste ou un dict
+        # renvoyé par Gemini compte comme renseigné (et n'est pas hachable)
+        complete_fields = sum(
+            1 for field in _SCHEMA_KEYS
+            if (value := result.get(field, ""))
+            and not (isinstance(value, str) and value in _INCOMPLETE_VALUES)
+        )
+        
+        return complete_fields / len(_SCHEMA_KEYS) * 100
     
     def generate_output_files(self, processed_data: List[Dict[str, Any]]) -> Dict[str, Path]:
         """
@@ -204,64 +220,60 @@ class DataProcessor:
         
         self.logger.info(f"📁 Génération des fichiers de sortie")
         
+        # Colonnes présentes dans les données, calculées une fois pour les deux formats
+        existing_columns = set().union(*processed_data)
+        
         # Générer le CSV
-        self._generate_csv(processed_data, csv_path)
+        self._generate_csv(processed_data, csv_path, existing_columns)
         
         # Générer l'Excel avec mise en forme
-        self._generate_excel(processed_data, excel_path)
+        self._generate_excel(processed_data, excel_path, existing_columns)
         
         return {
             'csv': csv_path,
             'excel': excel_path
         }
     
-    def _generate_csv(self, data: List[Dict[str, Any]], output_path: Path):
+    def _generate_csv(self, data: List[Dict[str, Any]], output_path: Path, existing_columns: Set[str]):
         """Génère le fichier CSV"""
         try:
-            df = pd.DataFrame(data)
+            # Garder seulement les colonnes qui existent, dans un ordre logique
+            available_columns = [col for col in _CSV_COLUMN_ORDER if col in existing_columns]
             
-            # Réorganiser les colonnes dans un ordre logique
-            column_order = [
-                'numero_sequence', 'nom_fichier', 'nom_produit', 'description_type',
-                'volume', 'prix_fcfa', 'code_barres_ean', 'code_article',
-                'source_information', 'statut', 'score_completude',
-                'date_traitement', 'chemin_fichier'
-            ]
-            
-            # Garder seulement les colonnes qui existent
-            available_columns = [col for col in column_order if col in df.columns]
-            df = df[available_columns]
-            
-            df.to_csv(output_path, index=False, encoding='utf-8-sig')
+            # Écrire les lignes au fil de l'eau, sans DataFrame intermédiaire,
+            # avec un tampon large pour regrouper les écritures
+            with output_path.open('w', buffering=_CSV_BUFFER_SIZE, encoding='utf-8-sig', newline='') as csv_file:
+                writer = csv.DictWriter(
+                    csv_file, fieldnames=available_columns, extrasaction='ignore', lineterminator='\n'
+                )
+                writer.writeheader()
+                writer.writerows(data)
             self.logger.info(f"✅ Fichier CSV généré: {output_path.name}")
             
         except Exception as e:
             self.logger.error(f"Erreur lors de la génération CSV: {e}")
             raise
     
-    def _generate_excel(self, data: List[Dict[str, Any]], output_path: Path):
+    def _generate_excel(self, data: List[Dict[str, Any]], output_path: Path, existing_columns: Set[str]):
         """Génère le fichier Excel avec mise en forme"""
+        import pandas as pd
+        import xlsxwriter
+        
         try:
-            df = pd.DataFrame(data)
-            
-            # Réorganiser les colonnes
-            column_order = [
-                'numero_sequence', 'nom_fichier', 'nom_produit', 'description_type',
-                'volume', 'prix_fcfa', 'code_barres_ean', 'code_article',
-                'source_information', 'statut', 'score_completude',
-                'date_traitement'
-            ]
-            
-            available_columns = [col for col in column_order if col in df.columns]
-            df = df[available_columns]
+            # Construire directement les seules colonnes exportées, sans inférence de type
+            available_columns = [col for col in _XLSX_COLUMN_ORDER if col in existing_columns]
+            df = pd.DataFrame(data, columns=available_columns, dtype=object)
+            df = df.where(df.notna(), None)
             
-            # Sauvegarder avec openpyxl pour la mise en forme
-            with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
-                df.to_excel(writer, sheet_name='Résultats', index=False)
+            # xlsxwriter en mode constant_memory écrit les lignes au fil de l'eau
+            with xlsxwriter.Workbook(output_path, {'constant_memory': True}) as workbook:
+                worksheet = workbook.add_worksheet('Résultats')
                 
-                # Mise en forme
-                worksheet = writer.sheets['Résultats']
-                self._format_excel_worksheet(worksheet, df)
+                # Mise en forme (en-têtes et largeurs) avant les données
+                self._format_excel_worksheet(workbook, worksheet, df)
+                
+                for row_num, row in enumerate(df.itertuples(index=False), 1):
+                    worksheet.write_row(row_num, 0, row)
             
             self.logger.info(f"✅ Fichier Excel généré: {output_path.name}")
             
@@ -269,32 +281,22 @@ class DataProcessor:
             self.logger.error(f"Erreur lors de la génération Excel: {e}")
             raise
     
-    def _format_excel_worksheet(self, worksheet, df):
+    def _format_excel_worksheet(self, workbook, worksheet, df):
         """Applique la mise en forme au fichier Excel"""
         # En-têtes en gras avec fond coloré
-        header_font = Font(bold=True, color="FFFFFF")
-        header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-        
-        for col_num, column_title in enumerate(df.columns, 1):
-            cell = worksheet.cell(row=1, column=col_num)
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = Alignment(horizontal="center")
-        
-        # Ajuster la largeur des colonnes
-        for column in worksheet.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            
+        header_format = workbook.add_format({
+            'bold': True,
+            'font_color': '#FFFFFF',
+            'bg_color': '#366092',
+            'align': 'center'
+        })
+        worksheet.write_row(0, 0, df.columns, header_format)
+        
+        # Ajuster la largeur des colonnes à partir du contenu le plus long
+        for col_num, column_title in enumerate(df.columns):
+            max_length = max(len(str(column_title)), df[column_title].astype(str).str.len().max())
             adjusted_width = min(max_length + 2, 50)
-            worksheet.column_dimensions[column_letter].width = adjusted_width
+            worksheet.set_column(col_num, col_num, adjusted_width)
     
     def _log_processing_stats(self, stats: Dict[str, int]):
         """Log les statistiques de traitement"""
@@ -322,18 +324,27 @@ class DataProcessor:
         if total_images == 0:
             return {"error": "Aucune donnée à analyser"}
         
-        # Calculer les statistiques
-        statuts = [item.get('statut', 'Inconnu') for item in processed_data]
-        scores = [item.get('score_completude', 0) for item in processed_data if isinstance(item.get('score_completude'), (int, float))]
+        # Calculer les statistiques en un seul parcours
+        statuts = Counter()
+        score_total = 0.0
+        score_count = 0
+        for item in processed_data:
+            statuts[item.get('statut', 'Inconnu')] += 1
+            score = item.get('score_completude')
+            if isinstance(score, (int, float)):
+                score_total += score
+                score_count += 1
         
         report = {
             'total_images': total_images,
-            'images_completes': statuts.count('Complet'),
-            'images_partielles': statuts.count('Partiel'),
-            'images_erreur': statuts.count('Erreur'),
-            'score_moyen': sum(scores) / len(scores) if scores else 0,
-            'taux_succes': ((statuts.count('Complet') + statuts.count('Partiel')) / total_images) * 100,
-            'date_traitement': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            'images_completes': statuts['Complet'],
+            'images_partielles': statuts['Partiel'],
+            'images_erreur': statuts['Erreur'],
+            'score_moyen': score_total / score_count if score_count else 0,
+            'taux_succes': ((statuts['Complet'] + statuts['Partiel']) / total_images) * 100,
+            # Réutiliser l'horodatage du lot plutôt que de relire l'horloge
+            'date_traitement': processed_data[0].get('date_traitement')
+                               or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         }
         
         return report
\ No newline at end of file
@@ -1,13 +1,14 @@
 import os
 import shutil
 import logging
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, List, Optional
 from datetime import datetime
 
 from config.settings import (
    INPUT_DIR, PROCESSED_DIR, OUTPUT_DIR, ARCHIVE_DIR,
-   SUPPORTED_IMAGE_FORMATS
+   SUPPORTED_IMAGE_FORMATS, ensure_directories
 )
 
 
@@ -16,10 +17,12 @@ class FileManager:
    
    def __init__(self):
        self.logger = logging.getLogger(__name__)
-       self.input_dir = Path(INPUT_DIR)
-       self.processed_dir = Path(PROCESSED_DIR)
-       self.output_dir = Path(OUTPUT_DIR)
-       self.archive_dir = Path(ARCHIVE_DIR)
+       ensure_directories()
+       self.input_dir = INPUT_DIR
+       self.processed_dir = PROCESSED_DIR
+       self.output_dir = OUTPUT_DIR
+       self.archive_dir = ARCHIVE_DIR
+       self._stem_counters: Dict[str, int] = {}
    
    def get_input_images(self) -> List[Path]:
        """
@@ -28,32 +31,38 @@ class FileManager:
        Returns:
            List[Path]: Liste des chemins vers les images valides
        """
-       if not self.input_dir.exists():
+       images = []
+       # os.scandir réutilise le type d'entrée fourni par le système (pas de stat par fichier)
+       try:
+           with os.scandir(self.input_dir) as entries:
+               for entry in entries:
+                   if not entry.is_file():
+                       continue
+                   if self._is_valid_image(entry.name):
+                       images.append(entry.path)
+                       self.logger.debug(f"Image valide trouvée : {entry.name}")
+                   else:
+                       self.logger.warning(f"Fichier ignoré (format non supporté) : {entry.name}")
+       except FileNotFoundError:
            self.logger.error(f"Le dossier d'entrée n'existe pas : {self.input_dir}")
            return []
        
-       images = []
-       for file_path in self.input_dir.iterdir():
-           if file_path.is_file() and self._is_valid_image(file_path):
-               images.append(file_path)
-               self.logger.debug(f"Image valide trouvée : {file_path.name}")
-           elif file_path.is_file():
-               self.logger.warning(f"Fichier ignoré (format non supporté) : {file_path.name}")
-       
        self.logger.info(f"📸 {len(images)} images valides trouvées dans {self.input_dir}")
-       return sorted(images)
+       # Trier les chemins sous forme de chaînes avant de construire les Path
+       return [Path(path) for path in sorted(images)]
    
-   def _is_valid_image(self, file_path: Path) -> bool:
+   def _is_valid_image(self, file_name: str) -> bool:
        """
        Vérifie si un fichier est une image supportée
        
        Args:
-           file_path (Path): Chemin vers le fichier
+           file_name (str): Nom du fichier (sans construire de Path)
            
        Returns:
            bool: True si l'image est supportée
        """
-       return file_path.suffix.lower() in SUPPORTED_IMAGE_FORMATS
+       # Comme Path.suffix, splitext ne voit pas d'extension dans « .jpg »
+       return os.path.splitext(file_name)[1].lower() in SUPPORTED_IMAGE_FORMATS
    
    def move_to_processed(self, image_path: Path) -> Path:
        """
@@ -65,17 +74,26 @@ class FileManager:
        Returns:
            Path: Nouveau chemin de l'image
        """
-       destination = self.processed_dir / image_path.name
-       
-       # Éviter les conflits de noms
-       counter = 1
-       while destination.exists():
-           stem = image_path.stem
-           suffix = image_path.suffix
-           destination = self.processed_dir / f"{stem}_{counter}{suffix}"
-           counter += 1
-       
-       shutil.move(str(image_path), str(destination))
+       # Éviter les conflits de noms : le compteur est mémorisé par nom de fichier
+       # et chaque destination est réservée atomiquement (O_EXCL)
+       stem, suffix = image_path.stem, image_path.suffix
+       counter = self._stem_counters.get(image_path.name, 0)
+       while True:
+           name = image_path.name if counter == 0 else f"{stem}_{counter}{suffix}"
+           destination = self.processed_dir / name
+           try:
+               os.close(os.open(destination, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+               break
+           except FileExistsError:
+               counter += 1
+       self._stem_counters[image_path.name] = counter + 1
+       
+       try:
+           shutil.move(str(image_path), str(destination))
+       except OSError:
+           # Libérer le nom réservé si le déplacement échoue
+           destination.unlink(missing_ok=True)
+           raise
        self.logger.debug(f"Image déplacée : {image_path.name} → {destination.name}")
        return destination
    
@@ -95,28 +113,43 @@ class FileManager:
        archive_folder = self.archive_dir / f"session_{session_id}"
        archive_folder.mkdir(parents=True, exist_ok=True)
        
-       # Compter les fichiers à archiver
-       files_to_archive = list(self.processed_dir.glob("*"))
-       if not files_to_archive:
-           self.logger.info("Aucun fichier à archiver dans le dossier processed")
-           return archive_folder
+       # Sur un même système de fichiers, un simple renommage suffit
+       same_fs = self.processed_dir.stat().st_dev == archive_folder.stat().st_dev
        
        # Déplacer tous les fichiers du dossier processed vers l'archive
-       for file_path in files_to_archive:
-           if file_path.is_file():
-               destination = archive_folder / file_path.name
-               shutil.move(str(file_path), str(destination))
+       files_archived = 0
+       with os.scandir(self.processed_dir) as entries:
+           for entry in entries:
+               if not entry.is_file():
+                   continue
+               destination = archive_folder / entry.name
+               if same_fs:
+                   os.replace(entry.path, destination)
+               else:
+                   shutil.move(entry.path, str(destination))
+               files_archived += 1
+       
+       # Le dossier processed est vide : les noms peuvent de nouveau être réutilisés
+       self._stem_counters.clear()
+       
+       if not files_archived:
+           self.logger.info("Aucun fichier à archiver dans le dossier processed")
+           return archive_folder
        
-       self.logger.info(f"📦 {len(files_to_archive)} fichiers archivés dans {archive_folder}")
+       self.logger.info(f"📦 {files_archived} fichiers archivés dans {archive_folder}")
        return archive_folder
    
    def clean_processed_dir(self):
        """Nettoie le dossier processed de tous ses fichiers"""
        files_cleaned = 0
-       for file_path in self.processed_dir.glob("*"):
-           if file_path.is_file():
-               file_path.unlink()
-               files_cleaned += 1
+       with os.scandir(self.processed_dir) as entries:
+           for entry in entries:
+               if entry.is_file():
+                   os.unlink(entry.path)
+                   files_cleaned += 1
+       
+       # Le dossier processed est vide : les noms peuvent de nouveau être réutilisés
+       self._stem_counters.clear()
        
        if files_cleaned > 0:
            self.logger.info(f"🧹 {files_cleaned} fichiers supprimés du dossier processed")
@@ -128,14 +161,16 @@ class FileManager:
        Returns:
            List[Path]: Liste des fichiers de sortie récents
        """
+       # Un seul stat() par fichier retenu, via le cache de DirEntry
        output_files = []
-       for file_path in self.output_dir.glob("*"):
-           if file_path.is_file() and file_path.suffix in {'.csv', '.xlsx'}:
-               output_files.append(file_path)
+       with os.scandir(self.output_dir) as entries:
+           for entry in entries:
+               if entry.is_file() and os.path.splitext(entry.name)[1] in {'.csv', '.xlsx'}:
+                   output_files.append((entry.stat().st_mtime, Path(entry.path)))
        
        # Trier par date de modification (plus récent en premier)
-       output_files.sort(key=lambda x: x.stat().st_mtime, reverse=True)
-       return output_files
+       output_files.sort(key=lambda item: item[0], reverse=True)
+       return [file_path for _, file_path in output_files]
    
    def create_session_id(self) -> str:
        """
@@ -181,4 +216,36 @@ class FileManager:
                return False
        
        self.logger.info("✅ Tous les dossiers sont valides")
-       return True
\ No newline at end of file
+       return True
+
+
+@lru_cache(maxsize=1)
+def get_file_manager() -> FileManager:
+   """
+   Retourne l'instance de FileManager partagée par tous les composants
+
+   Returns:
+       FileManager: Instance unique, créée au premier appel
+   """
+   return FileManager()
+
+
+def open_sequential(path: Path, buffering: int = -1):
+   """
+   Ouvre un fichier en lecture binaire en signalant au noyau une lecture séquentielle
+
+   Args:
+       path (Path): Fichier à lire
+       buffering (int): Taille du tampon de lecture (-1 pour la valeur par défaut)
+
+   Returns:
+       Objet fichier ouvert en mode 'rb'
+   """
+   f = open(path, 'rb', buffering=buffering)
+   # Lecture anticipée plus agressive sur un cache froid (Linux / POSIX uniquement)
+   if hasattr(os, 'posix_fadvise'):
+       try:
+           os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+       except OSError:
+           pass
+   return f
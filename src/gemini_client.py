@@ -1,12 +1,73 @@
 import logging
-import base64
-import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+from itertools import islice
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import Iterable, List, Dict, Any
 from tenacity import retry, stop_after_attempt, wait_exponential
-import google.generativeai as genai
+import orjson
 
-from config.settings import GOOGLE_API_KEY, GEMINI_MODEL, BATCH_SIZE, PRODUCT_SCHEMA
+from config.settings import (
+    GOOGLE_API_KEY, GEMINI_MODEL, BATCH_SIZE, MAX_CONCURRENT_BATCHES, PRODUCT_SCHEMA
+)
+from src.file_manager import open_sequential
+
+# Modèles de résultats, copiés plutôt que reconstruits champ par champ
+_SCHEMA_FIELDS = tuple(PRODUCT_SCHEMA)
+_DEFAULT_PRODUCT = dict.fromkeys(_SCHEMA_FIELDS, "Non détecté")
+_ERROR_PRODUCT = dict.fromkeys(_SCHEMA_FIELDS, "Erreur d'analyse")
+
+# Types MIME par extension d'image
+_MIME_TYPES = {
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.png': 'image/png',
+    '.webp': 'image/webp',
+    '.heic': 'image/heic',
+    '.heif': 'image/heif'
+}
+
+
+@lru_cache(maxsize=4)
+def _build_analysis_prompt(num_images: int) -> str:
+    """
+    Construit le prompt d'analyse pour un nombre d'images donné
+    
+    Le texte ne dépend que du nombre d'images : il est mémorisé d'un lot à l'autre.
+    """
+    fields_description = "\n".join([f"- {key}: {desc}" for key, desc in PRODUCT_SCHEMA.items()])
+    
+    prompt = f"""
+Analysez ces {num_images} images de produits et extrayez les informations suivantes pour chaque produit visible.
+
+INFORMATIONS À EXTRAIRE:
+{fields_description}
+
+INSTRUCTIONS:
+1. Retournez un JSON valide avec un tableau "produits"
+2. Chaque produit doit contenir tous les champs demandés
+3. Si une information n'est pas visible ou illisible, indiquez "Non détecté"
+4. Pour source_information, utilisez "Lisible" si toutes les infos sont claires, "Partiellement lisible" sinon
+5. Assurez-vous que le JSON est bien formaté et valide
+
+FORMAT DE RÉPONSE ATTENDU:
+{{
+  "produits": [
+    {{
+      "nom_produit": "...",
+      "description_type": "...",
+      "volume": "...",
+      "prix_fcfa": "...",
+      "code_barres_ean": "...",
+      "code_article": "...",
+      "source_information": "Lisible/Partiellement lisible"
+    }}
+  ]
+}}
+
+Analysez maintenant les images et retournez uniquement le JSON demandé.
+"""
+    return prompt
 
 
 class GeminiClient:
@@ -15,50 +76,72 @@ class GeminiClient:
     def __init__(self):
         self.logger = logging.getLogger(__name__)
         self.batch_size = BATCH_SIZE
+        self.max_concurrent_batches = max(1, MAX_CONCURRENT_BATCHES)
         
         # Configuration de l'API Gemini
         if not GOOGLE_API_KEY:
             raise ValueError("GOOGLE_API_KEY n'est pas configurée")
         
+        # Import différé : le SDK (gRPC, protobuf) n'est chargé qu'à la création du client
+        import google.generativeai as genai
+        
         genai.configure(api_key=GOOGLE_API_KEY)
         self.model = genai.GenerativeModel(GEMINI_MODEL)
         
         self.logger.info(f"Client Gemini initialisé avec le modèle: {GEMINI_MODEL}")
     
-    def analyze_images(self, image_paths: List[Path]) -> List[Dict[str, Any]]:
+    def analyze_images(self, image_paths: Iterable[Path]) -> List[Dict[str, Any]]:
         """
         Analyse toutes les images par lots
         
+        Les images peuvent être fournies au fil de l'eau (générateur) : chaque lot
+        est envoyé dès qu'il est complet, sans attendre la préparation des suivants.
+        
         Args:
-            image_paths (List[Path]): Liste des chemins vers les images
+            image_paths (Iterable[Path]): Chemins vers les images
             
         Returns:
             List[Dict]: Liste des résultats d'analyse
         """
-        all_results = []
-        total_images = len(image_paths)
+        self.logger.info(f"🧠 Début de l'analyse des images par lots de {self.batch_size}")
         
-        self.logger.info(f"🧠 Début de l'analyse de {total_images} images par lots de {self.batch_size}")
+        image_iter = iter(image_paths)
+        batches: List[List[Path]] = []
         
-        # Traiter par lots
-        for i in range(0, total_images, self.batch_size):
-            batch = image_paths[i:i + self.batch_size]
-            batch_num = (i // self.batch_size) + 1
-            total_batches = (total_images + self.batch_size - 1) // self.batch_size
+        # Les lots sont indépendants : les appels API sont lancés en parallèle,
+        # dans la limite de max_concurrent_batches requêtes simultanées
+        with ThreadPoolExecutor(max_workers=self.max_concurrent_batches) as executor:
+            futures = {}
+            while True:
+                batch = list(islice(image_iter, self.batch_size))
+                if not batch:
+                    break
+                
+                batch_idx = len(batches)
+                batches.append(batch)
+                self.logger.debug(f"📦 Envoi du lot {batch_idx + 1} ({len(batch)} images)")
+                futures[executor.submit(self._analyze_batch, batch)] = batch_idx
             
-            self.logger.info(f"📦 Traitement du lot {batch_num}/{total_batches} ({len(batch)} images)")
+            total_batches = len(batches)
+            batch_results: List[List[Dict[str, Any]]] = [[] for _ in batches]
             
-            try:
-                batch_results = self._analyze_batch(batch)
-                all_results.extend(batch_results)
-                
-                self.logger.info(f"✅ Lot {batch_num} terminé avec succès")
+            for future in as_completed(futures):
+                batch_idx = futures[future]
+                batch_num = batch_idx + 1
                 
-            except Exception as e:
-                self.logger.error(f"❌ Erreur lors du traitement du lot {batch_num}: {e}")
-                # Ajouter des résultats vides pour maintenir la correspondance
-                for image_path in batch:
-                    all_results.append(self._create_error_result(image_path, str(e)))
+                try:
+                    batch_results[batch_idx] = future.result()
+                    self.logger.info(f"✅ Lot {batch_num}/{total_batches} terminé avec succès")
+                    
+                except Exception as e:
+                    self.logger.error(f"❌ Erreur lors du traitement du lot {batch_num}: {e}")
+                    # Ajouter des résultats vides pour maintenir la correspondance
+                    batch_results[batch_idx] = [
+                        self._create_error_result(image_path, str(e)) for image_path in batches[batch_idx]
+                    ]
+        
+        # Reconstituer les résultats dans l'ordre des images
+        all_results = [result for results in batch_results for result in results]
         
         self.logger.info(f"🎯 Analyse terminée: {len(all_results)} résultats générés")
         return all_results
@@ -74,24 +157,15 @@ class GeminiClient:
         Returns:
             List[Dict]: Résultats pour chaque image du lot
         """
-        # Préparer les images pour l'API
-        image_data = []
-        for image_path in image_paths:
-            encoded_image = self._encode_image(image_path)
-            image_data.append({
-                'mime_type': self._get_mime_type(image_path),
-                'data': encoded_image
-            })
-        
         # Créer le prompt
         prompt = self._create_analysis_prompt(len(image_paths))
         
-        # Préparer le contenu pour l'API
+        # Préparer le contenu pour l'API (octets bruts : le SDK se charge de l'encodage)
         content = [prompt]
-        for img_data in image_data:
+        for image_path in image_paths:
             content.append({
-                'mime_type': img_data['mime_type'],
-                'data': img_data['data']
+                'mime_type': self._get_mime_type(image_path),
+                'data': self._read_image(image_path)
             })
         
         try:
@@ -109,21 +183,23 @@ class GeminiClient:
             self.logger.error(f"Erreur lors de l'appel API: {e}")
             raise
     
-    def _encode_image(self, image_path: Path) -> str:
+    def _read_image(self, image_path: Path) -> bytes:
         """
-        Encode une image en base64
+        Lit le contenu brut d'une image
         
         Args:
             image_path (Path): Chemin vers l'image
             
         Returns:
-            str: Image encodée en base64
+            bytes: Contenu de l'image
         """
         try:
-            with open(image_path, 'rb') as image_file:
-                return base64.b64encode(image_file.read()).decode('utf-8')
+            # Une seule lecture non tamponnée, à la taille exacte du fichier ; un mmap
+            # n'apporterait rien puisque le SDK exige un objet bytes (copie inévitable)
+            with open_sequential(image_path, buffering=0) as f:
+                return f.readall()
         except Exception as e:
-            self.logger.error(f"Erreur lors de l'encodage de {image_path.name}: {e}")
+            self.logger.error(f"Erreur lors de la lecture de {image_path.name}: {e}")
             raise
     
     def _get_mime_type(self, image_path: Path) -> str:
@@ -136,16 +212,7 @@ class GeminiClient:
         Returns:
             str: Type MIME
         """
-        extension = image_path.suffix.lower()
-        mime_types = {
-            '.jpg': 'image/jpeg',
-            '.jpeg': 'image/jpeg',
-            '.png': 'image/png',
-            '.webp': 'image/webp',
-            '.heic': 'image/heic',
-            '.heif': 'image/heif'
-        }
-        return mime_types.get(extension, 'image/jpeg')
+        return _MIME_TYPES.get(image_path.suffix.lower(), 'image/jpeg')
     
     def _create_analysis_prompt(self, num_images: int) -> str:
         """
@@ -157,39 +224,7 @@ class GeminiClient:
         Returns:
             str: Prompt formaté
         """
-        fields_description = "\n".join([f"- {key}: {desc}" for key, desc in PRODUCT_SCHEMA.items()])
-        
-        prompt = f"""
-Analysez ces {num_images} images de produits et extrayez les informations suivantes pour chaque produit visible.
-
-INFORMATIONS À EXTRAIRE:
-{fields_description}
-
-INSTRUCTIONS:
-1. Retournez un JSON valide avec un tableau "produits"
-2. Chaque produit doit contenir tous les champs demandés
-3. Si une information n'est pas visible ou illisible, indiquez "Non détecté"
-4. Pour source_information, utilisez "Lisible" si toutes les infos sont claires, "Partiellement lisible" sinon
-5. Assurez-vous que le JSON est bien formaté et valide
-
-FORMAT DE RÉPONSE ATTENDU:
-{{
-  "produits": [
-    {{
-      "nom_produit": "...",
-      "description_type": "...",
-      "volume": "...",
-      "prix_fcfa": "...",
-      "code_barres_ean": "...",
-      "code_article": "...",
-      "source_information": "Lisible/Partiellement lisible"
-    }}
-  ]
-}}
-
-Analysez maintenant les images et retournez uniquement le JSON demandé.
-"""
-        return prompt
+        return _build_analysis_prompt(num_images)
     
     def _parse_gemini_response(self, response_text: str, image_paths: List[Path]) -> List[Dict[str, Any]]:
         """
@@ -204,15 +239,16 @@ Analysez maintenant les images et retournez uniquement le JSON demandé.
         """
         try:
             # Nettoyer la réponse (supprimer les balises markdown si présentes)
+            # (```json, ```JSON ou ``` seul en ouverture)
             cleaned_response = response_text.strip()
-            if cleaned_response.startswith('```json'):
+            if cleaned_response[:7].lower() == '```json':
                 cleaned_response = cleaned_response[7:]
-            if cleaned_response.endswith('```'):
-                cleaned_response = cleaned_response[:-3]
-            cleaned_response = cleaned_response.strip()
+            else:
+                cleaned_response = cleaned_response.removeprefix('```')
+            cleaned_response = cleaned_response.removesuffix('```').strip()
             
             # Parser le JSON
-            parsed_data = json.loads(cleaned_response)
+            parsed_data = orjson.loads(cleaned_response)
             
             if 'produits' not in parsed_data:
                 raise ValueError("Format de réponse invalide: clé 'produits' manquante")
@@ -241,7 +277,7 @@ Analysez maintenant les images et retournez uniquement le JSON demandé.
             
             return results
             
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             self.logger.error(f"Erreur de parsing JSON: {e}")
             self.logger.debug(f"Réponse brute: {response_text[:500]}...")
             # Retourner des résultats vides pour toutes les images
@@ -261,19 +297,14 @@ Analysez maintenant les images et retournez uniquement le JSON demandé.
         Returns:
             Dict: Données validées
         """
-        # S'assurer que tous les champs requis existent
-        for field in PRODUCT_SCHEMA.keys():
-            if field not in product or product[field] is None:
-                product[field] = "Non détecté"
-        
         # Nettoyer les valeurs
-        for key, value in product.items():
-            if isinstance(value, str):
-                product[key] = value.strip()
-            elif value is None:
-                product[key] = "Non détecté"
+        cleaned = {
+            key: value.strip() if isinstance(value, str) else ("Non détecté" if value is None else value)
+            for key, value in product.items()
+        }
         
-        return product
+        # S'assurer que tous les champs requis existent
+        return {**_DEFAULT_PRODUCT, **cleaned}
     
     def _create_empty_result(self, image_path: Path) -> Dict[str, Any]:
         """
@@ -285,7 +316,7 @@ Analysez maintenant les images et retournez uniquement le JSON demandé.
         Returns:
             Dict: Résultat vide
         """
-        result = {field: "Non détecté" for field in PRODUCT_SCHEMA.keys()}
+        result = _DEFAULT_PRODUCT.copy()
         result.update({
             'nom_fichier': image_path.name,
             'chemin_fichier': str(image_path),
@@ -304,7 +335,7 @@ Analysez maintenant les images et retournez uniquement le JSON demandé.
         Returns:
             Dict: Résultat d'erreur
         """
-        result = {field: "Erreur d'analyse" for field in PRODUCT_SCHEMA.keys()}
+        result = _ERROR_PRODUCT.copy()
         result.update({
             'nom_fichier': image_path.name,
             'chemin_fichier': str(image_path),
@@ -1,11 +1,83 @@
 import logging
+import math
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
-from typing import List, Tuple
-from PIL import Image, ImageOps
+from typing import Iterator, List, Optional, Tuple
+from PIL import Image
 import os
+import shutil
 
 from config.settings import MAX_IMAGE_SIZE_MB, COMPRESSION_QUALITY, PROCESSED_DIR
-from src.file_manager import FileManager
+from src.file_manager import get_file_manager, open_sequential
+
+# libvips (optionnel) : décodage, réduction et encodage en un seul flux
+try:
+    import pyvips
+except (ImportError, OSError):
+    pyvips = None
+
+if pyvips is not None:
+    # libvips relaie ses messages de suivi au niveau INFO
+    logging.getLogger('pyvips').setLevel(logging.WARNING)
+    # Sans métadonnées en sortie, comme avec Pillow ('strip' est obsolète depuis libvips 8.15)
+    _VIPS_JPEG_OPTIONS = (
+        {'keep': 'none'} if pyvips.at_least_libvips(8, 15) else {'strip': True}
+    )
+
+# Tampon de lecture des images sources (évite les lectures par blocs de 8 Ko)
+_READ_BUFFER_SIZE = 1 << 20
+
+# Fréquence des messages de progression (en nombre d'images)
+_PROGRESS_EVERY = 25
+
+# Dimension maximale (largeur ou hauteur) des images envoyées à Gemini
+_MAX_DIMENSION = 2048
+
+# Qualité JPEG minimale et pas entre deux essais (le plus grand est celui d'origine)
+_MIN_QUALITY = 20
+_MIN_QUALITY_STEP = 5
+_MAX_QUALITY_STEP = 15
+
+# Instance propre à chaque processus de travail (voir _init_worker)
+_worker_processor: Optional['ImageProcessor'] = None
+
+
+def _init_worker(log_queue: multiprocessing.Queue, log_level: int):
+    """
+    Initialise l'ImageProcessor d'un processus de travail
+    
+    Args:
+        log_queue (multiprocessing.Queue): File relayant les logs vers le processus principal
+        log_level (int): Niveau du logger racine du processus principal
+    """
+    global _worker_processor
+    
+    # Un processus lancé en 'spawn' n'hérite pas de la configuration du logging :
+    # ses messages sont renvoyés aux handlers (console, fichier) du processus principal
+    root_logger = logging.getLogger()
+    root_logger.handlers[:] = [QueueHandler(log_queue)]
+    root_logger.setLevel(log_level)
+    
+    _worker_processor = ImageProcessor()
+
+
+def _process_in_worker(image_path: Path) -> Tuple[Optional[Path], Optional[str]]:
+    """
+    Traite une image dans un processus de travail
+    
+    Args:
+        image_path (Path): Chemin vers l'image source
+        
+    Returns:
+        Tuple: (chemin de l'image traitée, None) ou (None, message d'erreur)
+    """
+    try:
+        return _worker_processor._process_single_image(image_path), None
+    except Exception as e:
+        return None, str(e)
 
 
 class ImageProcessor:
@@ -13,10 +85,12 @@ class ImageProcessor:
     
     def __init__(self):
         self.logger = logging.getLogger(__name__)
-        self.file_manager = FileManager()
+        self.file_manager = get_file_manager()
         self.max_size_bytes = MAX_IMAGE_SIZE_MB * 1024 * 1024
         self.compression_quality = COMPRESSION_QUALITY
-        self.processed_dir = Path(PROCESSED_DIR)
+        self.processed_dir = PROCESSED_DIR
+        # Tampon d'encodage réutilisé d'une tentative (et d'une image) à l'autre
+        self._encode_buf = BytesIO()
     
     def process_batch(self, image_paths: List[Path]) -> List[Path]:
         """
@@ -28,22 +102,61 @@ class ImageProcessor:
         Returns:
             List[Path]: Liste des chemins vers les images traitées
         """
-        processed_images = []
+        return list(self.iter_processed_images(image_paths))
+    
+    def iter_processed_images(self, image_paths: List[Path]) -> Iterator[Path]:
+        """
+        Traite un lot d'images en rendant chaque image dès qu'elle est prête
+        
+        Args:
+            image_paths (List[Path]): Liste des chemins vers les images
+            
+        Yields:
+            Path: Chemin vers chaque image traitée, dans l'ordre d'entrée
+        """
+        processed_count = 0
         
         self.logger.info(f"🔄 Début du traitement de {len(image_paths)} images")
         
-        for i, image_path in enumerate(image_paths, 1):
-            try:
-                self.logger.info(f"Traitement image {i}/{len(image_paths)}: {image_path.name}")
-                processed_path = self._process_single_image(image_path)
-                processed_images.append(processed_path)
+        if not image_paths:
+            return
+        
+        # Décodage, redimensionnement et encodage sont limités par le CPU :
+        # les images sont réparties sur plusieurs processus, dans l'ordre d'entrée
+        max_workers = min(os.cpu_count() or 1, len(image_paths))
+        chunksize = max(1, len(image_paths) // (max_workers * 4))
+        
+        # 'spawn' plutôt que 'fork' : le SDK Gemini (gRPC) a déjà démarré ses threads
+        mp_context = multiprocessing.get_context('spawn')
+        root_logger = logging.getLogger()
+        log_queue = mp_context.Queue()
+        log_listener = QueueListener(log_queue, *root_logger.handlers, respect_handler_level=True)
+        log_listener.start()
+        
+        try:
+            with ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=mp_context,
+                initializer=_init_worker,
+                initargs=(log_queue, root_logger.getEffectiveLevel())
+            ) as executor:
+                results = executor.map(_process_in_worker, image_paths, chunksize=chunksize)
                 
-            except Exception as e:
-                self.logger.error(f"❌ Erreur lors du traitement de {image_path.name}: {e}")
-                continue
+                for i, (image_path, (processed_path, error)) in enumerate(zip(image_paths, results), 1):
+                    if error is not None:
+                        self.logger.error(f"❌ Erreur lors du traitement de {image_path.name}: {error}")
+                        continue
+                    
+                    self.logger.debug(f"Image traitée {i}/{len(image_paths)}: {image_path.name}")
+                    processed_count += 1
+                    yield processed_path
+                    
+                    if i % _PROGRESS_EVERY == 0:
+                        self.logger.info(f"🔄 {i}/{len(image_paths)} images traitées")
+        finally:
+            log_listener.stop()
         
-        self.logger.info(f"✅ {len(processed_images)} images traitées avec succès")
-        return processed_images
+        self.logger.info(f"✅ {processed_count} images traitées avec succès")
     
     def _process_single_image(self, image_path: Path) -> Path:
         """
@@ -55,18 +168,27 @@ class ImageProcessor:
         Returns:
             Path: Chemin vers l'image traitée
         """
-        # Destination dans le dossier processed
+        # Destination dans le dossier processed ; un résidu d'une exécution précédente
+        # peut être un lien physique vers une image source : le supprimer plutôt que
+        # de réécrire son contenu
         output_path = self.processed_dir / image_path.name
+        output_path.unlink(missing_ok=True)
         
         # Vérifier la taille initiale
         initial_size = self.file_manager.get_file_size_mb(image_path)
         self.logger.debug(f"Taille initiale: {initial_size:.2f} Mo")
         
         if initial_size <= MAX_IMAGE_SIZE_MB:
-            # Image déjà dans les limites, simple copie
-            import shutil
-            shutil.copy2(image_path, output_path)
-            self.logger.debug(f"Image copiée sans modification: {image_path.name}")
+            # Image déjà dans les limites, simple lien physique (copie si le dossier
+            # processed est sur un autre système de fichiers) ; seul l'en-tête est lu
+            # pour écarter dès ici les fichiers qui ne sont pas des images
+            with Image.open(image_path):
+                pass
+            try:
+                os.link(image_path, output_path)
+            except OSError:
+                shutil.copy2(image_path, output_path)
+            self.logger.debug(f"Image reprise sans modification: {image_path.name}")
             return output_path
         
         # Compression nécessaire
@@ -89,10 +211,24 @@ class ImageProcessor:
         Returns:
             Path: Chemin vers l'image compressée
         """
+        if pyvips is not None:
+            try:
+                return self._compress_image_vips(input_path, output_path)
+            except pyvips.Error as e:
+                self.logger.debug(f"libvips n'a pas pu traiter {input_path.name}, repli sur Pillow: {e}")
+        
         try:
-            # Ouvrir l'image avec PIL
-            with Image.open(input_path) as img:
-                # Corriger l'orientation basée sur les métadonnées EXIF
+            # Ouvrir l'image avec PIL, via une lecture séquentielle tamponnée
+            with open_sequential(input_path, _READ_BUFFER_SIZE) as fp, Image.open(fp) as img:
+                # JPEG : décoder directement à 1/2, 1/4 ou 1/8 de la résolution
+                # lorsque l'image reste au moins aussi grande que la taille finale
+                scale = _MAX_DIMENSION / max(img.size)
+                if scale < 1:
+                    img.draft('RGB', (math.ceil(img.width * scale), math.ceil(img.height * scale)))
+                
+                # Corriger l'orientation basée sur les métadonnées EXIF (ImageOps n'est
+                # chargé que pour ce repli Pillow)
+                from PIL import ImageOps
                 img = ImageOps.exif_transpose(img)
                 
                 # Convertir en RGB si nécessaire (pour éviter les problèmes avec PNG, etc.)
@@ -109,39 +245,101 @@ class ImageProcessor:
                 # Redimensionner si nécessaire
                 img = self._resize_if_needed(img)
                 
-                # Sauvegarder avec compression progressive
+                # Ajuster la qualité jusqu'à obtenir la taille désirée, en mémoire
+                buffer = self._encode_buf
                 quality = self.compression_quality
-                temp_path = output_path
-                
-                # Ajuster la qualité jusqu'à obtenir la taille désirée
-                for attempt in range(5):  # Maximum 5 tentatives
+                while True:
+                    # Réécrire depuis le début sans tronquer : la capacité est conservée
+                    buffer.seek(0)
                     img.save(
-                        temp_path,
+                        buffer,
                         'JPEG',
                         quality=quality,
                         optimize=True,
                         progressive=True
                     )
                     
-                    current_size = self.file_manager.get_file_size_mb(temp_path)
-                    
-                    if current_size <= MAX_IMAGE_SIZE_MB:
+                    if buffer.tell() <= self.max_size_bytes:
                         self.logger.debug(f"Compression réussie avec qualité {quality}")
                         break
                     
-                    # Réduire la qualité pour la prochaine tentative
-                    quality = max(20, quality - 15)
-                    
-                    if attempt == 4:  # Dernière tentative
+                    quality = self._next_quality(quality, buffer.tell())
+                    if quality is None:
                         self.logger.warning(f"Impossible de réduire {input_path.name} sous {MAX_IMAGE_SIZE_MB} Mo")
+                        break
                 
-                return temp_path
+                # Sauvegarder une seule fois, avec la qualité retenue
+                with buffer.getbuffer() as view:
+                    output_path.write_bytes(view[:buffer.tell()])
+                return output_path
                 
         except Exception as e:
             self.logger.error(f"Erreur lors de la compression de {input_path.name}: {e}")
             raise
     
-    def _resize_if_needed(self, img: Image.Image, max_dimension: int = 2048) -> Image.Image:
+    def _compress_image_vips(self, input_path: Path, output_path: Path) -> Path:
+        """
+        Compresse une image avec libvips
+        
+        Args:
+            input_path (Path): Chemin vers l'image source
+            output_path (Path): Chemin de sortie
+            
+        Returns:
+            Path: Chemin vers l'image compressée
+        """
+        # thumbnail applique l'orientation EXIF et réduit l'image dès le décodage
+        img = pyvips.Image.thumbnail(str(input_path), _MAX_DIMENSION, height=_MAX_DIMENSION, size='down')
+        
+        # Convertir en RGB, sur fond blanc pour les images avec transparence
+        if img.interpretation != 'srgb':
+            img = img.colourspace('srgb')
+        if img.hasalpha():
+            img = img.flatten(background=[255, 255, 255])
+        
+        # Matérialiser une seule fois : chaque tentative réencode depuis la mémoire
+        img = img.copy_memory()
+        
+        # Ajuster la qualité jusqu'à obtenir la taille désirée
+        quality = self.compression_quality
+        while True:
+            data = img.jpegsave_buffer(Q=quality, optimize_coding=True, interlace=True, **_VIPS_JPEG_OPTIONS)
+            
+            if len(data) <= self.max_size_bytes:
+                self.logger.debug(f"Compression réussie avec qualité {quality}")
+                break
+            
+            quality = self._next_quality(quality, len(data))
+            if quality is None:
+                self.logger.warning(f"Impossible de réduire {input_path.name} sous {MAX_IMAGE_SIZE_MB} Mo")
+                break
+        
+        output_path.write_bytes(data)
+        return output_path
+    
+    def _next_quality(self, quality: int, encoded_size: int) -> Optional[int]:
+        """
+        Calcule la qualité JPEG à essayer après un encodage trop lourd
+        
+        La qualité baisse en proportion du dépassement mesuré : un léger dépassement
+        ne coûte que quelques points (lisibilité des prix et codes-barres), un fort
+        dépassement descend par pas de 15 au plus.
+        
+        Args:
+            quality (int): Qualité du dernier essai
+            encoded_size (int): Taille obtenue avec cette qualité (octets)
+            
+        Returns:
+            Optional[int]: Prochaine qualité, ou None si la qualité minimale est atteinte
+        """
+        if quality <= _MIN_QUALITY:
+            return None
+        
+        step = math.ceil(quality * (1 - self.max_size_bytes / encoded_size))
+        step = min(_MAX_QUALITY_STEP, max(_MIN_QUALITY_STEP, step))
+        return max(_MIN_QUALITY, quality - step)
+    
+    def _resize_if_needed(self, img: Image.Image, max_dimension: int = _MAX_DIMENSION) -> Image.Image:
         """
         Redimensionne l'image si elle est trop grande
         
@@ -200,31 +398,42 @@ class ImageProcessor:
         """
         Valide que toutes les images traitées respectent les contraintes
         
+        Les images ont déjà été lues (et réencodées si besoin) par process_batch :
+        seule la taille est contrôlée ici, sans second décodage.
+        
         Args:
             image_paths (List[Path]): Liste des images à valider
             
         Returns:
             List[Path]: Liste des images valides
         """
-        valid_images = []
-        
-        for image_path in image_paths:
-            try:
-                # Vérifier la taille
-                size_mb = self.file_manager.get_file_size_mb(image_path)
-                if size_mb > MAX_IMAGE_SIZE_MB:
-                    self.logger.warning(f"Image trop lourde ignorée: {image_path.name} ({size_mb:.2f} Mo)")
-                    continue
-                
-                # Vérifier que l'image peut être ouverte
-                with Image.open(image_path) as img:
-                    img.verify()
-                
-                valid_images.append(image_path)
-                
-            except Exception as e:
-                self.logger.error(f"Image invalide ignorée: {image_path.name} - {e}")
-                continue
+        valid_images = [path for path in image_paths if self.is_valid_processed_image(path)]
         
         self.logger.info(f"✅ {len(valid_images)}/{len(image_paths)} images validées")
-        return valid_images
\ No newline at end of file
+        return valid_images
+    
+    def is_valid_processed_image(self, image_path: Path) -> bool:
+        """
+        Vérifie qu'une image traitée respecte les contraintes de taille
+        
+        Args:
+            image_path (Path): Image à valider
+            
+        Returns:
+            bool: True si l'image peut être envoyée à Gemini
+        """
+        try:
+            # Vérifier la taille
+            size_mb = self.file_manager.get_file_size_mb(image_path)
+            if size_mb > MAX_IMAGE_SIZE_MB:
+                self.logger.warning(f"Image trop lourde ignorée: {image_path.name} ({size_mb:.2f} Mo)")
+                return False
+            if size_mb == 0:
+                self.logger.error(f"Image vide ignorée: {image_path.name}")
+                return False
+            
+            return True
+            
+        except Exception as e:
+            self.logger.error(f"Image invalide ignorée: {image_path.name} - {e}")
+            return False
\ No newline at end of file
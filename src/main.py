@@ -7,8 +7,8 @@ import sys
 from pathlib import Path
 from datetime import datetime
 
-from config.settings import LOGS_DIR
-from src.file_manager import FileManager
+from config.settings import LOGS_DIR, LOG_LEVEL
+from src.file_manager import get_file_manager
 from src.image_processor import ImageProcessor
 from src.gemini_client import GeminiClient
 from src.data_processor import DataProcessor
@@ -21,16 +21,28 @@ def setup_logging(session_id: str):
     
     log_file = LOGS_DIR / f"processing_{session_id}.log"
     
-    # Configuration du logging
+    # Le fichier garde tout le suivi (INFO), la console suit LOG_LEVEL
+    file_handler = logging.FileHandler(log_file, encoding='utf-8')
+    file_handler.setLevel(logging.INFO)
+    console_handler = logging.StreamHandler(sys.stdout)
+    
+    # Un nom de niveau inconnu est renvoyé sous forme de chaîne : repli sur INFO
+    console_level = logging.getLevelName(LOG_LEVEL.upper())
+    if not isinstance(console_level, int):
+        console_level = logging.INFO
+    console_handler.setLevel(console_level)
+    
+    # Configuration du logging (horodatage court, sans millisecondes)
     logging.basicConfig(
-        level=logging.INFO,
+        level=min(logging.INFO, console_handler.level),
         format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler(log_file, encoding='utf-8'),
-            logging.StreamHandler(sys.stdout)
-        ]
+        datefmt='%H:%M:%S',
+        handlers=[file_handler, console_handler]
     )
     
+    if console_level == logging.INFO and LOG_LEVEL.upper() != 'INFO':
+        logging.getLogger(__name__).warning(f"⚠️  LOG_LEVEL inconnu ({LOG_LEVEL}), niveau INFO utilisé")
+    
     return log_file
 
 
@@ -53,7 +65,7 @@ def main():
         # 1. Initialisation des composants
         logger.info("🔧 Initialisation des composants...")
         
-        file_manager = FileManager()
+        file_manager = get_file_manager()
         image_processor = ImageProcessor()
         gemini_client = GeminiClient()
         data_processor = DataProcessor()
@@ -80,22 +92,15 @@ def main():
         
         logger.info(f"📊 {len(input_images)} images trouvées pour traitement")
         
-        # 4. Prétraitement des images
-        logger.info("🔄 Prétraitement des images...")
-        
-        processed_images = image_processor.process_batch(input_images)
-        if not processed_images:
-            logger.error("❌ Aucune image n'a pu être traitée")
-            return 1
-        
-        # Validation des images traitées
-        valid_images = image_processor.validate_processed_images(processed_images)
-        if not valid_images:
-            logger.error("❌ Aucune image valide après traitement")
-            return 1
+        # 4. Prétraitement des images et 5. Analyse avec Gemini, en flux : chaque lot
+        # part vers l'API dès que ses images sont prêtes, pendant que les suivantes
+        # sont encore prétraitées
+        logger.info("🔄 Prétraitement et analyse des images avec Gemini...")
         
-        # 5. Analyse avec Gemini
-        logger.info("🧠 Analyse des images avec Gemini...")
+        valid_images = (
+            image_path for image_path in image_processor.iter_processed_images(input_images)
+            if image_processor.is_valid_processed_image(image_path)
+        )
         
         analysis_results = gemini_client.analyze_images(valid_images)
         if not analysis_results: